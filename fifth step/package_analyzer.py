@@ -3,12 +3,194 @@ import argparse
 import sys
 import os
 import json
-import urllib.request
-import urllib.error
-from collections import deque, defaultdict
+import gzip
+import hashlib
+import http.client
+import urllib.parse
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import subprocess
 
 
+# Допустимые схемы URL репозитория
+_URL_PREFIXES = ('http://', 'https://')
+
+# Экранирование идентификаторов и подписей в строках Graphviz
+_DOT_ESCAPE = str.maketrans({'"': '\\"', '\\': '\\\\'})
+
+# Сокращенные метаданные npm: только поля, нужные для установки пакета.
+# Реестры без их поддержки (зеркала, прокси) ответят полным документом
+ABBREVIATED_METADATA = 'application/vnd.npm.install-v1+json'
+REGISTRY_ACCEPT = f'{ABBREVIATED_METADATA}; q=1.0, application/json; q=0.8, */*'
+
+# Каталог дискового кэша ответов реестра (тело ответа + ETag); свой подкаталог,
+# чтобы не смешиваться с кэшем зависимостей четвертого этапа (dependencies)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'package_analyzer', 'responses')
+
+# Число параллельных запросов к реестру при обходе графа
+MAX_FETCH_WORKERS = 16
+
+# Открытые соединения с реестром, свои у каждого потока: (схема, хост) -> HTTP(S)Connection
+_local = threading.local()
+
+
+def _http_get(url, headers):
+    """GET-запрос через переиспользуемое keep-alive соединение"""
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    path = parts.path or '/'
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    _connections = _local.connections
+
+    for attempt in range(2):
+        conn = _connections.get(key)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(parts.netloc, timeout=10)
+            _connections[key] = conn
+
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+        except (http.client.HTTPException, OSError):
+            # Сервер закрыл простаивающее соединение - переподключаемся один раз
+            conn.close()
+            del _connections[key]
+            if attempt:
+                raise
+
+
+def _cache_paths(url):
+    """Пути к сохраненному телу ответа и его ETag для URL"""
+    key = f"{ABBREVIATED_METADATA} {url}"
+    base = os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest())
+    return base + '.json', base + '.etag'
+
+
+def _store_cached(url, body, etag):
+    """Сохранение ответа реестра в дисковый кэш (ошибки записи не критичны)"""
+    if not etag:
+        return
+    body_path, etag_path = _cache_paths(url)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(body_path, 'wb') as f:
+            f.write(body)
+        with open(etag_path, 'w', encoding='utf-8') as f:
+            f.write(etag)
+    except OSError:
+        pass
+
+
+def _slim_package_data(package_data):
+    """Сокращение метаданных пакета до последней версии и ее зависимостей"""
+    if 'dist-tags' in package_data and 'latest' in package_data['dist-tags']:
+        latest_version = package_data['dist-tags']['latest']
+    else:
+        versions = list(package_data.get('versions', {}).keys())
+        if not versions:
+            return {'latest': None, 'dependencies': {}}
+        latest_version = versions[-1]
+
+    version_data = package_data['versions'].get(latest_version, {})
+    return {'latest': latest_version, 'dependencies': version_data.get('dependencies', {})}
+
+
+@lru_cache(maxsize=4096)
+def _fetch_package_info(package_name, registry_url):
+    """
+    Загрузка метаданных пакета из npm registry (кэшируется в памяти и на диске).
+    Хранится только сокращенная форма: {'latest': версия, 'dependencies': {...}}
+    """
+    package_url = f"{registry_url}/{package_name}"
+    body_path, etag_path = _cache_paths(package_url)
+    headers = {
+        'User-Agent': 'PackageAnalyzer/1.0',
+        'Accept': REGISTRY_ACCEPT,
+        'Accept-Encoding': 'gzip'
+    }
+
+    # Условный запрос: при неизменном ETag реестр ответит 304 без тела
+    if os.path.exists(body_path):
+        try:
+            with open(etag_path, 'r', encoding='utf-8') as f:
+                headers['If-None-Match'] = f.read().strip()
+        except OSError:
+            pass
+
+    try:
+        response, body = _http_get(package_url, headers=headers)
+
+        if response.status == 304:
+            with open(body_path, 'rb') as f:
+                return json.loads(f.read())
+
+        if response.status == 200:
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            data = _slim_package_data(json.loads(body))
+            _store_cached(package_url, json.dumps(data).encode('utf-8'), response.getheader('ETag'))
+            return data
+
+    except Exception as e:
+        raise Exception(f"Ошибка получения информации о пакете: {e}")
+
+    if response.status == 404:
+        raise Exception(f"Пакет '{package_name}' не найден в репозитории")
+    raise Exception(f"Ошибка HTTP {response.status}: {response.reason}")
+
+
+@lru_cache(maxsize=8)
+def _load_test_repository(file_path):
+    """Загрузка тестового репозитория из файла (кэшируется по пути)"""
+    try:
+        with open(file_path, 'rb') as f:
+            return json.loads(f.read())
+    except Exception as e:
+        raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
+
+
+def _kahn_order(indptr, targets, node_count):
+    """
+    Топологическая сортировка (алгоритм Кана) над CSR-массивами.
+    Очередь - заранее выделенный массив с индексом головы; узлы,
+    входящие в циклы, в результат не попадают
+    """
+    in_degree = array('l', [0]) * node_count
+    for target in targets:
+        in_degree[target] += 1
+
+    queue = array('l', (i for i in range(node_count) if in_degree[i] == 0))
+    head = 0
+
+    while head < len(queue):
+        current = queue[head]
+        head += 1
+
+        for edge in range(indptr[current], indptr[current + 1]):
+            neighbor = targets[edge]
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                queue.append(neighbor)
+
+    return queue
+
+
+def _buffer_stdout():
+    """
+    Блочная буферизация stdout: вывод копится и сбрасывается после каждого этапа,
+    а не построчно. Потоки без reconfigure (подмененный stdout) остаются как есть
+    """
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False)
+
+
 class PackageAnalyzer:
     def __init__(self):
         self.args = None
@@ -16,8 +198,18 @@ class PackageAnalyzer:
         self.dependency_graph = defaultdict(list)
         self.visited = set()
         self.cycle_detected = False
+        self.cycles = []
         self.load_order = []
         self.all_packages = set()
+        self.nodes = []
+        self.node_index = {}
+        self.indptr = array('l', [0])
+        self.edge_targets = array('l')
+        self.edge_versions = []
+        self._dep_cache = {}
+        self._test_repo = None
+        self._dot_cache = {}
+        self._npm_proc = None
 
     def parse_arguments(self):
         """Парсинг аргументов командной строки"""
@@ -102,7 +294,7 @@ class PackageAnalyzer:
         elif args.max_depth > 10:
             print("Предупреждение: большая глубина анализа может привести к длительному выполнению")
 
-        if args.url and not args.url.startswith(('http://', 'https://')):
+        if args.url and not args.url.startswith(_URL_PREFIXES):
             errors.append("URL должен начинаться с http:// или https://")
 
         if args.test_repo and not os.path.exists(args.test_repo):
@@ -123,195 +315,370 @@ class PackageAnalyzer:
             "Максимальная глубина": args.max_depth
         }
 
-        for key, value in config.items():
-            print(f"{key}: {value}")
-        print("=" * 50)
+        lines = [f"{key}: {value}" for key, value in config.items()]
+        sys.stdout.write("\n".join(lines) + "\n" + "=" * 50 + "\n")
 
     def fetch_package_info(self, package_name, registry_url):
         """Получение информации о пакете из npm registry"""
-        try:
-            package_url = f"{registry_url}/{package_name}"
-
-            req = urllib.request.Request(
-                package_url,
-                headers={'User-Agent': 'PackageAnalyzer/1.0'}
-            )
-
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status == 200:
-                    return json.loads(response.read().decode('utf-8'))
-                else:
-                    raise Exception(f"HTTP {response.status}: {response.reason}")
-
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                raise Exception(f"Пакет '{package_name}' не найден в репозитории")
-            else:
-                raise Exception(f"Ошибка HTTP {e.code}: {e.reason}")
-        except Exception as e:
-            raise Exception(f"Ошибка получения информации о пакете: {e}")
+        return _fetch_package_info(package_name, registry_url)
 
     def extract_dependencies(self, package_data):
-        """Извлечение зависимостей из данных пакета"""
+        """Извлечение зависимостей из сокращенных данных пакета"""
         try:
-            if 'dist-tags' in package_data and 'latest' in package_data['dist-tags']:
-                latest_version = package_data['dist-tags']['latest']
-            else:
-                versions = list(package_data.get('versions', {}).keys())
-                if not versions:
-                    return {}
-                latest_version = versions[-1]
-
-            version_data = package_data['versions'].get(latest_version, {})
-            return version_data.get('dependencies', {})
-
+            return package_data['dependencies']
         except Exception as e:
             raise Exception(f"Ошибка извлечения зависимостей: {e}")
 
     def load_test_repository(self, file_path):
         """Загрузка тестового репозитория из файла"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
+        return _load_test_repository(file_path)
 
     def get_direct_dependencies(self, package_name):
-        """Получение прямых зависимостей для пакета"""
+        """Получение прямых зависимостей для пакета (с кэшированием)"""
+        if package_name in self._dep_cache:
+            return self._dep_cache[package_name]
+
+        dependencies = self.load_direct_dependencies(package_name)
+        self._dep_cache[package_name] = dependencies
+        return dependencies
+
+    def load_direct_dependencies(self, package_name):
+        """
+        Загрузка прямых зависимостей пакета без обращения к _dep_cache
+        (его заполняет только основной поток)
+        """
         if self.args.test_repo:
-            test_data = self.load_test_repository(self.args.test_repo)
-            dependencies = test_data.get(package_name, [])
-            return {dep: "*" for dep in dependencies} if dependencies else {}
+            if self._test_repo is None:
+                self._test_repo = self.load_test_repository(self.args.test_repo)
+            dependencies = self._test_repo.get(package_name, [])
+            # В тестовом репозитории версий нет - ребра хранят None
+            dependencies = dict.fromkeys(dependencies) if dependencies else {}
         else:
             package_data = self.fetch_package_info(package_name, self.args.url)
-            return self.extract_dependencies(package_data)
-
-    def build_dependency_graph_bfs(self, start_package, current_depth=0, path=None):
-        """Построение графа зависимостей с помощью BFS с рекурсией"""
-        if path is None:
-            path = []
+            dependencies = self.extract_dependencies(package_data)
 
-        if current_depth >= self.args.max_depth:
-            return
-
-        if start_package in path:
-            print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(path + [start_package])}")
-            self.cycle_detected = True
-            return
+        return dependencies
 
-        current_path = path + [start_package]
-        self.all_packages.add(start_package)
+    def build_dependency_graph_bfs(self, start_package):
+        """Построение графа зависимостей обходом в ширину (уровни загружаются параллельно)"""
+        self.expand_dependency_graph([start_package])
+        self.freeze_graph()
+        self.report_cycles()
 
-        try:
-            dependencies = self.get_direct_dependencies(start_package)
-
-            for dep_package, version in dependencies.items():
-                self.dependency_graph[start_package].append((dep_package, version))
-                self.all_packages.add(dep_package)
-                self.build_dependency_graph_bfs(dep_package, current_depth + 1, current_path)
-
-        except Exception as e:
-            print(f"⚠️  Ошибка при обработке пакета {start_package}: {e}")
+    def expand_dependency_graph(self, start_packages):
+        """
+        Обход в ширину сразу от нескольких стартовых пакетов с дополнением
+        self.dependency_graph; каждый пакет раскрывается не более одного раза
+        """
+        expanded = set()
+        # Имена пакетов интернируются: одна строка на пакет во всех структурах графа
+        frontier = [sys.intern(package) for package in start_packages]
+        depth = 0
+
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            while frontier and depth < self.args.max_depth:
+                level = []
+                for package in frontier:
+                    if package not in expanded:
+                        expanded.add(package)
+                        level.append(package)
+
+                # Запросы уровня независимы - отправляем их одновременно, а граф
+                # и кэш зависимостей изменяем только из основного потока
+                futures = [
+                    None if package in self._dep_cache
+                    else executor.submit(self.load_direct_dependencies, package)
+                    for package in level
+                ]
+
+                frontier = []
+                for package, future in zip(level, futures):
+                    self.all_packages.add(package)
+
+                    if future is None:
+                        dependencies = self._dep_cache[package]
+                    else:
+                        try:
+                            dependencies = future.result()
+                        except Exception as e:
+                            print(f"⚠️  Ошибка при обработке пакета {package}: {e}")
+                            continue
+                        self._dep_cache[package] = dependencies
+
+                    for dep_package, version in dependencies.items():
+                        dep_package = sys.intern(dep_package)
+                        self.dependency_graph[package].append((dep_package, version))
+                        self.all_packages.add(dep_package)
+                        if dep_package not in expanded:
+                            frontier.append(dep_package)
+
+                depth += 1
+
+    def extract_subgraph(self, graph, start_package):
+        """
+        Выделение из уже построенного графа части, достижимой из пакета
+        не глубже max_depth, без повторной загрузки зависимостей
+        """
+        subgraph = defaultdict(list)
+        packages = set()
+        expanded = set()
+        frontier = [start_package]
+        depth = 0
+
+        while frontier and depth < self.args.max_depth:
+            next_frontier = []
+            for package in frontier:
+                if package in expanded:
+                    continue
+                expanded.add(package)
+                packages.add(package)
+
+                for dep_package, version in graph.get(package, ()):
+                    subgraph[package].append((dep_package, version))
+                    packages.add(dep_package)
+                    if dep_package not in expanded:
+                        next_frontier.append(dep_package)
+
+            frontier = next_frontier
+            depth += 1
+
+        return subgraph, packages
+
+    def report_cycles(self):
+        """Поиск циклов по готовому графу и вывод предупреждений"""
+        self.cycles = self.find_cycles()
+        for component in self.cycles:
+            print(f"⚠️  Обнаружена циклическая зависимость между пакетами: {', '.join(component)}")
+        self.cycle_detected = bool(self.cycles)
+
+    def find_cycles(self):
+        """
+        Поиск циклических зависимостей: компоненты сильной связности графа
+        (итеративный алгоритм Тарьяна, O(V + E))
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        cycles = []
+
+        for root in list(self.dependency_graph):
+            if root in index:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.dependency_graph.get(root, ())))]
+
+            while work:
+                node, children = work[-1]
+
+                for child, _ in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.dependency_graph.get(child, ()))))
+                        break
+                    if child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    # Все потомки узла обработаны
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+
+                        is_self_loop = any(dep == node for dep, _ in self.dependency_graph.get(node, ()))
+                        if len(component) > 1 or is_self_loop:
+                            cycles.append(component[::-1])
+
+        return cycles
+
+    def freeze_graph(self):
+        """
+        Фиксация построенного графа в плоских CSR-массивах над индексами узлов:
+        ребра узла i - edge_targets[indptr[i]:indptr[i + 1]],
+        их версии - edge_versions с теми же позициями
+        """
+        nodes = list(self.dependency_graph)
+        nodes.extend(self.all_packages.difference(self.dependency_graph))
+        node_index = {name: i for i, name in enumerate(nodes)}
+
+        indptr = array('l', [0])
+        edge_targets = array('l')
+        edge_versions = []
+        for name in nodes:
+            for dep_package, version in self.dependency_graph.get(name, ()):
+                edge_targets.append(node_index[dep_package])
+                edge_versions.append(version)
+            indptr.append(len(edge_targets))
+
+        self.nodes = nodes
+        self.node_index = node_index
+        self.indptr = indptr
+        self.edge_targets = edge_targets
+        self.edge_versions = edge_versions
+        # DOT-описания относятся к прежнему графу
+        self._dot_cache.clear()
 
     def calculate_load_order(self, start_package):
-        """Расчет порядка загрузки зависимостей"""
-        in_degree = defaultdict(int)
-        all_nodes = self.all_packages
+        """Расчет порядка загрузки зависимостей (алгоритм Кана над индексами узлов)"""
+        order = _kahn_order(self.indptr, self.edge_targets, len(self.nodes))
+        load_order = [self.nodes[i] for i in order]
+        self.load_order = load_order
+        return load_order
 
-        for node, deps in self.dependency_graph.items():
-            for dep, _ in deps:
-                in_degree[dep] += 1
+    def print_load_order(self, start_package):
+        """Вывод порядка загрузки зависимостей"""
+        if not self.load_order:
+            print("Порядок загрузки не рассчитан")
+            return
 
-        for node in all_nodes:
-            if node not in in_degree:
-                in_degree[node] = 0
+        print(f"\n=== ПОРЯДОК ЗАГРУЗКИ ЗАВИСИМОСТЕЙ ===")
 
-        queue = deque([node for node in all_nodes if in_degree[node] == 0])
-        load_order = []
+        dependencies_order = [pkg for pkg in self.load_order if pkg != start_package]
 
-        while queue:
-            current = queue.popleft()
-            load_order.append(current)
+        print(f"Стартовый пакет: {start_package}")
+        print(f"\nПорядок загрузки зависимостей:")
 
-            for neighbor, _ in self.dependency_graph.get(current, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+        for i, package in enumerate(dependencies_order, 1):
+            print(f"{i:2d}. {package}")
 
-        self.load_order = load_order
-        return load_order
+        print(f"\nФинальная загрузка: {start_package}")
+        print(f"Всего зависимостей для загрузки: {len(dependencies_order)}")
 
     def generate_graphviz_dot(self, start_package):
         """
         Генерация описания графа на языке Graphviz DOT
+        (результат кэшируется по стартовому пакету и глубине до следующего freeze_graph)
         """
-        dot_lines = [
+        cache_key = (start_package, self.args.max_depth)
+        if cache_key in self._dot_cache:
+            return self._dot_cache[cache_key]
+
+        start = start_package.translate(_DOT_ESCAPE)
+        header = [
             "digraph DependencyGraph {",
             "    rankdir=TB;",
             "    node [shape=box, style=filled, fillcolor=lightblue];",
             "    edge [color=darkgreen];",
             "",
-            f'    // Граф зависимостей для пакета "{start_package}"',
+            f'    // Граф зависимостей для пакета "{start}"',
             f'    // Глубина анализа: {self.args.max_depth}',
             f'    // Всего пакетов: {len(self.all_packages)}',
-            ""
+            "",
+            # Стартовый пакет выделяется особым оформлением
+            f'    "{start}" [fillcolor=orange, style="filled,bold"];',
         ]
 
-        # Добавляем узлы с особым оформлением для стартового пакета
-        dot_lines.append(f'    "{start_package}" [fillcolor=orange, style="filled,bold"];')
+        # Остальные узлы; имена экранируются один раз и дальше берутся по индексу
+        names = [package.translate(_DOT_ESCAPE) for package in self.nodes]
+        start_index = self.node_index[start_package]
+        nodes = (f'    "{name}";' for i, name in enumerate(names) if i != start_index)
+
+        # Ребра (зависимости); ребра внутри цикла выделяются красным цветом
+        cycle_of = {package: i for i, component in enumerate(self.cycles) for package in component}
+        cycle_ids = [cycle_of.get(package, -1) for package in self.nodes]
+        indptr, targets, versions = self.indptr, self.edge_targets, self.edge_versions
+
+        def edge_line(source, edge):
+            target = targets[edge]
+            version = versions[edge]
+            attributes = [] if version is None else [f'label="{version.translate(_DOT_ESCAPE)}"']
+            if cycle_ids[source] != -1 and cycle_ids[source] == cycle_ids[target]:
+                attributes.append("color=red, style=bold")
+            attributes = f" [{', '.join(attributes)}]" if attributes else ""
+            return f'    "{names[source]}" -> "{names[target]}"{attributes};'
+
+        edges = (edge_line(source, edge)
+                 for source in range(len(names))
+                 for edge in range(indptr[source], indptr[source + 1]))
+
+        footer = ["}"]
+
+        dot_content = "\n".join(chain(
+            header, nodes, ("", "    // Зависимости между пакетами"), edges, footer
+        ))
+        self._dot_cache[cache_key] = dot_content
+        return dot_content
+
+    def print_ascii_tree(self, start_package):
+        """
+        Построение ASCII-дерева зависимостей (итеративно, вывод одной записью).
+        Уже выведенные поддеревья не повторяются и помечаются (*)
+        """
+        lines = [f"\n🌳 ASCII-ДЕРЕВО ЗАВИСИМОСТЕЙ ДЛЯ: {start_package}", "=" * 50]
+        nodes, indptr, targets = self.nodes, self.indptr, self.edge_targets
+        seen = bytearray(len(nodes))
+        versions = self.edge_versions
+        stack = [(self.node_index[start_package], None, "", True)]
 
-        # Добавляем остальные узлы
-        for package in self.all_packages:
-            if package != start_package:
-                dot_lines.append(f'    "{package}";')
+        while stack:
+            node, version, prefix, is_last = stack.pop()
+            connector = "└── " if is_last else "├── "
+            version_suffix = "" if version is None else f" ({version})"
 
-        dot_lines.append("")
+            if seen[node]:
+                lines.append(f"{prefix}{connector}{nodes[node]}{version_suffix} (*)")
+                continue
 
-        # Добавляем ребра (зависимости)
-        dot_lines.append("    // Зависимости между пакетами")
-        for source, dependencies in self.dependency_graph.items():
-            for target, version in dependencies:
-                dot_lines.append(f'    "{source}" -> "{target}" [label="{version}"];')
+            seen[node] = 1
+            lines.append(f"{prefix}{connector}{nodes[node]}{version_suffix}")
 
-        # Выделяем циклические зависимости красным цветом
-        if self.cycle_detected:
-            dot_lines.append("")
-            dot_lines.append("    // Циклические зависимости")
-            dot_lines.append('    edge [color=red, style=bold];')
-            # Здесь можно добавить конкретные циклические зависимости
+            child_prefix = prefix + ("    " if is_last else "│   ")
+            first, last = indptr[node], indptr[node + 1] - 1
 
-        dot_lines.append("}")
+            # Дочерние узлы кладем в обратном порядке, чтобы снимать их со стека по порядку
+            for edge in range(last, first - 1, -1):
+                stack.append((targets[edge], versions[edge], child_prefix, edge == last))
 
-        dot_content = "\n".join(dot_lines)
-        return dot_content
+        sys.stdout.write("\n".join(lines) + "\n")
 
-    def print_ascii_tree(self, start_package, current_node=None, prefix="", is_last=True):
+    def start_npm_tree(self, start_package):
         """
-        Рекурсивное построение ASCII-дерева зависимостей
+        Запуск npm ls в фоновом процессе, чтобы он работал одновременно
+        с построением нашего графа
         """
-        if current_node is None:
-            current_node = start_package
-            print(f"\n🌳 ASCII-ДЕРЕВО ЗАВИСИМОСТЕЙ ДЛЯ: {start_package}")
-            print("=" * 50)
-
-        # Выводим текущий узел
-        connector = "└── " if is_last else "├── "
-        print(f"{prefix}{connector}{current_node}")
+        # Создаем временный package.json
+        test_package_json = {
+            "name": "test-package",
+            "version": "1.0.0",
+            "dependencies": {
+                start_package: "latest"
+            }
+        }
 
-        # Получаем зависимости текущего узла
-        dependencies = self.dependency_graph.get(current_node, [])
+        with open('temp_package.json', 'w') as f:
+            json.dump(test_package_json, f)
 
-        if not dependencies:
-            return
+        self._npm_proc = subprocess.Popen(
+            ['npm', 'ls', '--prefix', '.'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
 
-        # Обновляем префикс для дочерних узлов
-        new_prefix = prefix + ("    " if is_last else "│   ")
+    def stop_npm_tree(self):
+        """Завершение фонового npm ls и удаление временного package.json"""
+        if self._npm_proc is not None:
+            if self._npm_proc.poll() is None:
+                self._npm_proc.kill()
+                self._npm_proc.communicate()
+            self._npm_proc = None
 
-        # Рекурсивно выводим дочерние узлы
-        for i, (dep, version) in enumerate(dependencies):
-            is_last_child = i == len(dependencies) - 1
-            version_info = f" ({version})" if version != "*" else ""
-            self.print_ascii_tree(start_package, dep, new_prefix, is_last_child)
+        if os.path.exists('temp_package.json'):
+            os.remove('temp_package.json')
 
     def compare_with_npm_tree(self, start_package):
         """
@@ -324,42 +691,27 @@ class PackageAnalyzer:
         print(f"\n🔍 СРАВНЕНИЕ ВИЗУАЛИЗАЦИИ С NPM ДЛЯ ПАКЕТА '{start_package}'")
 
         try:
-            # Создаем временный package.json
-            test_package_json = {
-                "name": "test-package",
-                "version": "1.0.0",
-                "dependencies": {
-                    start_package: "latest"
-                }
-            }
+            # Обычно npm ls уже запущен из run(); иначе запускаем сейчас
+            if self._npm_proc is None:
+                self.start_npm_tree(start_package)
 
-            with open('temp_package.json', 'w') as f:
-                json.dump(test_package_json, f)
+            npm_output, _ = self._npm_proc.communicate(timeout=30)
 
-            # Получаем дерево npm
-            result = subprocess.run(
-                ['npm', 'ls', '--prefix', '.'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            if result.returncode in [0, 1]:  # npm ls возвращает 1 при unmet dependencies
+            if self._npm_proc.returncode in [0, 1]:  # npm ls возвращает 1 при unmet dependencies
                 print("\n📊 ВЫВОД NPM:")
-                print(result.stdout)
+                print(npm_output)
 
                 print("\n📊 НАША ВИЗУАЛИЗАЦИЯ:")
                 self.print_ascii_tree(start_package)
 
-                self.analyze_visualization_differences(result.stdout, start_package)
+                self.analyze_visualization_differences(npm_output, start_package)
             else:
                 print("⚠️  Ошибка выполнения npm ls")
 
         except Exception as e:
             print(f"⚠️  Ошибка сравнения: {e}")
         finally:
-            if os.path.exists('temp_package.json'):
-                os.remove('temp_package.json')
+            self.stop_npm_tree()
 
     def analyze_visualization_differences(self, npm_output, start_package):
         """
@@ -401,18 +753,20 @@ class PackageAnalyzer:
 
         original_max_depth = self.args.max_depth
 
+        # Один общий граф для всех примеров; граф каждого примера - его достижимая часть
+        self.dependency_graph.clear()
+        self.all_packages.clear()
+        self.expand_dependency_graph(demonstration_packages)
+        shared_graph = self.dependency_graph
+
         for i, package in enumerate(demonstration_packages, 1):
             print(f"\n📦 ПРИМЕР {i}: Визуализация для пакета '{package}'")
             print("-" * 50)
 
-            # Сбрасываем состояние для нового пакета
-            self.dependency_graph.clear()
-            self.cycle_detected = False
             self.load_order = []
-            self.all_packages.clear()
-
-            # Строим граф
-            self.build_dependency_graph_bfs(package)
+            self.dependency_graph, self.all_packages = self.extract_subgraph(shared_graph, package)
+            self.freeze_graph()
+            self.report_cycles()
 
             # ASCII-дерево
             if self.args.ascii_tree:
@@ -421,10 +775,7 @@ class PackageAnalyzer:
             # Graphviz
             if self.args.graphviz:
                 dot_content = self.generate_graphviz_dot(package)
-                print(f"\n📊 Graphviz DOT для пакета '{package}':")
-                print("=" * 40)
-                print(dot_content)
-                print("=" * 40)
+                print(f"\n📊 Graphviz DOT для пакета '{package}':\n{'=' * 40}\n{dot_content}\n{'=' * 40}")
 
                 # Сохраняем в файл если указан output
                 if self.args.output:
@@ -433,11 +784,14 @@ class PackageAnalyzer:
                         f.write(dot_content)
                     print(f"💾 Graphviz описание сохранено в: {filename}")
 
+            sys.stdout.flush()
+
         self.args.max_depth = original_max_depth
 
     def run(self):
         """Основной метод запуска приложения"""
         try:
+            _buffer_stdout()
             args = self.parse_arguments()
 
             errors = self.validate_arguments(args)
@@ -450,15 +804,28 @@ class PackageAnalyzer:
             self.print_configuration(args)
             self.args = args
 
+            # Тестовый репозиторий читается один раз за запуск
+            if args.test_repo:
+                self._test_repo = self.load_test_repository(args.test_repo)
+
             start_package = args.package if args.package else "A"
 
+            # npm ls для сравнения работает в фоне, пока строится наш граф
+            if not args.test_repo and args.package:
+                try:
+                    self.start_npm_tree(start_package)
+                except OSError:
+                    pass  # ошибка будет повторена и показана при сравнении
+
             # Построение графа зависимостей
             self.build_dependency_graph_bfs(start_package)
+            sys.stdout.flush()
 
             # Этап 4: Порядок загрузки (если нужен)
             if args.load_order:
                 self.calculate_load_order(start_package)
                 self.print_load_order(start_package)
+                sys.stdout.flush()
 
             # Этап 5: Визуализация
             print(f"\n{'=' * 60}")
@@ -472,10 +839,7 @@ class PackageAnalyzer:
             # Graphviz вывод
             if args.graphviz:
                 dot_content = self.generate_graphviz_dot(start_package)
-                print(f"\n📊 Graphviz DOT описание:")
-                print("=" * 50)
-                print(dot_content)
-                print("=" * 50)
+                print(f"\n📊 Graphviz DOT описание:\n{'=' * 50}\n{dot_content}\n{'=' * 50}")
 
                 # Сохранение в файл
                 if args.output:
@@ -486,10 +850,12 @@ class PackageAnalyzer:
                 print(f"\n💡 Для визуализации выполните:")
                 print(f"   dot -Tpng {args.output or 'output.dot'} -o graph.png")
                 print(f"   Или используйте онлайн инструмент: http://www.webgraphviz.com/")
+            sys.stdout.flush()
 
             # Сравнение с npm
             if not args.test_repo and args.package:
                 self.compare_with_npm_tree(start_package)
+                sys.stdout.flush()
 
             # Демонстрация для тестового репозитория
             if args.test_repo:
@@ -500,6 +866,9 @@ class PackageAnalyzer:
         except Exception as e:
             print(f"❌ Ошибка: {e}")
             sys.exit(1)
+        finally:
+            self.stop_npm_tree()
+            sys.stdout.flush()
 
 
 if __name__ == "__main__":
@@ -3,20 +3,64 @@ import argparse
 import sys
 import os
 import json
-import urllib.request
-import urllib.error
-from collections import deque, defaultdict
+import hashlib
+import time
+import http.client
+import urllib.parse
+import threading
+from collections import deque, defaultdict, Counter
+from itertools import chain
 import subprocess
+import shutil
+import tempfile
+import asyncio
+
+
+# Сокращенные метаданные npm (только поля для установки, в разы меньше полного документа);
+# реестры без их поддержки ответят обычным JSON
+REGISTRY_ACCEPT = 'application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*'
+
+# Максимум одновременных запросов к реестру (защита от ответов 429)
+MAX_CONCURRENT_FETCHES = 10
+
+# Дисковый кэш зависимостей между запусками и время жизни записи (секунды)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'package_analyzer', 'dependencies')
+CACHE_TTL = 3600
+
+
+def _buffer_stdout():
+    """
+    Блочная буферизация stdout: вывод копится и сбрасывается после каждого этапа,
+    а не построчно. Потоки без reconfigure (подмененный stdout) остаются как есть
+    """
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False)
 
 
 class PackageAnalyzer:
     def __init__(self):
         self.args = None
         self.dependencies = {}
-        self.dependency_graph = defaultdict(list)
+        # Граф: пакет -> {зависимость: версия}; повторное добавление ребра ничего не меняет
+        self.dependency_graph = defaultdict(dict)
         self.visited = set()
         self.cycle_detected = False
-        self.load_order = []
+        # Узлы, не попавшие в порядок загрузки из-за циклов (заполняется iter_load_order)
+        self.cyclic_nodes = []
+        self._dep_cache = {}
+        self._test_data = None
+        self._npm_executable = None
+        # Схема, хост и префикс пути реестра разбираются один раз в run()
+        self._registry_scheme = None
+        self._registry_netloc = None
+        self._url_prefix = None
+        # Входящие степени и узлы графа ведутся по мере добавления ребер
+        self._in_degree = Counter()
+        self._all_nodes = set()
+        # Keep-alive соединения с реестром: свои у каждого потока загрузки
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
 
     def parse_arguments(self):
         """Парсинг аргументов командной строки"""
@@ -71,6 +115,12 @@ class PackageAnalyzer:
             help='Вывести порядок загрузки зависимостей'
         )
 
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Не использовать дисковый кэш зависимостей из реестра'
+        )
+
         return parser.parse_args()
 
     def validate_arguments(self, args):
@@ -108,34 +158,71 @@ class PackageAnalyzer:
             "Максимальная глубина": args.max_depth
         }
 
-        for key, value in config.items():
-            print(f"{key}: {value}")
-        print("=" * 50)
-
-    def fetch_package_info(self, package_name, registry_url):
+        lines = [f"{key}: {value}" for key, value in config.items()]
+        sys.stdout.write("\n".join(lines) + "\n" + "=" * 50 + "\n")
+
+    def get_connection(self, scheme, netloc):
+        """Переиспользуемое соединение с реестром для текущего потока"""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(netloc, timeout=10)
+            connections[(scheme, netloc)] = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_connections(self):
+        """Закрытие всех открытых соединений с реестром"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def set_registry_url(self, registry_url):
+        """Разбор URL реестра: префикс пути для запросов пакетов вычисляется один раз"""
+        parts = urllib.parse.urlsplit(registry_url)
+        self._registry_scheme = parts.scheme
+        self._registry_netloc = parts.netloc
+        self._url_prefix = parts.path.rstrip('/') + '/'
+
+    def fetch_package_info(self, package_name):
         """Получение информации о пакете из npm registry"""
         try:
-            package_url = f"{registry_url}/{package_name}"
-
-            req = urllib.request.Request(
-                package_url,
-                headers={'User-Agent': 'PackageAnalyzer/1.0'}
-            )
-
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status == 200:
-                    return json.loads(response.read().decode('utf-8'))
-                else:
-                    raise Exception(f"HTTP {response.status}: {response.reason}")
-
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                raise Exception(f"Пакет '{package_name}' не найден в репозитории")
-            else:
-                raise Exception(f"Ошибка HTTP {e.code}: {e.reason}")
+            # Слэш scoped-пакетов (@types/node) кодируется, '@' остается как есть
+            path = self._url_prefix + urllib.parse.quote(package_name, safe='@')
+            scheme, netloc = self._registry_scheme, self._registry_netloc
+            headers = {'User-Agent': 'PackageAnalyzer/1.0', 'Accept': REGISTRY_ACCEPT}
+
+            for attempt in range(2):
+                conn = self.get_connection(scheme, netloc)
+                try:
+                    conn.request('GET', path, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    # Сервер закрыл простаивающее соединение - переподключаемся один раз
+                    conn.close()
+                    del self._local.connections[(scheme, netloc)]
+                    if attempt:
+                        raise
+
+            if response.status == 200:
+                return json.loads(body)
+
         except Exception as e:
             raise Exception(f"Ошибка получения информации о пакете: {e}")
 
+        if response.status == 404:
+            raise Exception(f"Пакет '{package_name}' не найден в репозитории")
+        raise Exception(f"Ошибка HTTP {response.status}: {response.reason}")
+
     def extract_dependencies(self, package_data):
         """Извлечение зависимостей из данных пакета"""
         try:
@@ -156,109 +243,238 @@ class PackageAnalyzer:
     def load_test_repository(self, file_path):
         """Загрузка тестового репозитория из файла"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(file_path, 'rb') as f:
+                return json.loads(f.read())
         except Exception as e:
             raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
 
-    def get_direct_dependencies(self, package_name):
-        """Получение прямых зависимостей для пакета"""
-        if self.args.test_repo:
-            test_data = self.load_test_repository(self.args.test_repo)
-            dependencies = test_data.get(package_name, [])
-            return {dep: "*" for dep in dependencies} if dependencies else {}
-        else:
-            package_data = self.fetch_package_info(package_name, self.args.url)
-            return self.extract_dependencies(package_data)
-
-    def build_dependency_graph_bfs(self, start_package, current_depth=0, path=None):
-        """Построение графа зависимостей с помощью BFS с рекурсией"""
-        if path is None:
-            path = []
-
-        if current_depth >= self.args.max_depth:
-            return
-
-        if start_package in path:
-            print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(path + [start_package])}")
-            self.cycle_detected = True
-            return
-
-        current_path = path + [start_package]
+    def cache_path(self, package_name):
+        """Путь к файлу дискового кэша для пакета в текущем реестре"""
+        # Ключ строится по разобранному URL: '--url http://r' и '--url http://r/' - один реестр
+        key = f"{self._registry_scheme}://{self._registry_netloc}{self._url_prefix} {package_name}"
+        return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
 
+    def load_cached_dependencies(self, package_name):
+        """Зависимости из дискового кэша или None, если записи нет или она устарела"""
+        path = self.cache_path(package_name)
         try:
-            dependencies = self.get_direct_dependencies(start_package)
+            if time.time() - os.path.getmtime(path) > CACHE_TTL:
+                return None
+            with open(path, 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def store_cached_dependencies(self, package_name, dependencies):
+        """Сохранение зависимостей в дисковый кэш (ошибки записи не критичны)"""
+        path = self.cache_path(package_name)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Запись через временный файл: параллельные загрузки не видят частичных данных
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(json.dumps(dependencies).encode('utf-8'))
+            os.replace(temp_path, path)
+        except OSError:
+            pass
 
-            for dep_package, version in dependencies.items():
-                self.dependency_graph[start_package].append((dep_package, version))
-                self.build_dependency_graph_bfs(dep_package, current_depth + 1, current_path)
+    def get_direct_dependencies(self, package_name):
+        """Получение прямых зависимостей для пакета (каждый пакет загружается один раз за запуск)"""
+        if package_name in self._dep_cache:
+            return self._dep_cache[package_name]
 
-        except Exception as e:
-            print(f"⚠️  Ошибка при обработке пакета {start_package}: {e}")
+        dependencies = self.load_direct_dependencies(package_name)
+        self._dep_cache[package_name] = dependencies
+        return dependencies
 
-    def calculate_load_order(self, start_package):
+    def load_direct_dependencies(self, package_name):
         """
-        Расчет порядка загрузки зависимостей с помощью топологической сортировки
+        Загрузка прямых зависимостей пакета без обращения к _dep_cache
+        (его заполняет только основной поток)
         """
-        print(f"\n📋 РАСЧЕТ ПОРЯДКА ЗАГРУЗКИ ДЛЯ ПАКЕТА '{start_package}'")
-
-        # Строим граф входящих степеней
-        in_degree = defaultdict(int)
-        all_nodes = set()
-
-        # Собираем все узлы и вычисляем входящие степени
-        for node, deps in self.dependency_graph.items():
-            all_nodes.add(node)
-            for dep, _ in deps:
-                all_nodes.add(dep)
-                in_degree[dep] += 1
+        if self.args.test_repo:
+            # Тестовый репозиторий разбирается один раз в run()
+            dependencies = self._test_data.get(package_name, [])
+            dependencies = {dep: "*" for dep in dependencies} if dependencies else {}
+        else:
+            dependencies = None if self.args.no_cache else self.load_cached_dependencies(package_name)
+            if dependencies is None:
+                package_data = self.fetch_package_info(package_name)
+                dependencies = self.extract_dependencies(package_data)
+                if not self.args.no_cache:
+                    self.store_cached_dependencies(package_name, dependencies)
+
+        return dependencies
+
+    def build_dependency_graph_bfs(self, start_package):
+        """Построение графа зависимостей обходом в ширину (пакеты уровня загружаются параллельно)"""
+        asyncio.run(self.build_dependency_graph_async(start_package))
+        self.detect_cycles(start_package)
+
+    async def build_dependency_graph_async(self, start_package):
+        """Обход в ширину по уровням: все пакеты уровня запрашиваются одновременно"""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+        async def fetch(package):
+            dependencies = self._dep_cache.get(package)
+            if dependencies is not None:
+                return dependencies
+            async with semaphore:
+                return await asyncio.to_thread(self.load_direct_dependencies, package)
+
+        visited = set()
+        frontier = [start_package]
+        depth = 0
+
+        while frontier and depth < self.args.max_depth:
+            level = [package for package in dict.fromkeys(frontier) if package not in visited]
+            visited.update(level)
+
+            results = await asyncio.gather(*(fetch(package) for package in level), return_exceptions=True)
+
+            frontier = []
+            for package, dependencies in zip(level, results):
+                if isinstance(dependencies, Exception):
+                    print(f"⚠️  Ошибка при обработке пакета {package}: {dependencies}")
+                    continue
+
+                # Результаты потоков попадают в кэш зависимостей только здесь, в основном потоке
+                self._dep_cache[package] = dependencies
+
+                edges = self.dependency_graph[package]
+                new_edges = {dep: version for dep, version in dependencies.items() if dep not in edges}
+                if not new_edges:
+                    continue
+
+                # Ребра, узлы и входящие степени обновляются пакетно, без цикла по ребрам
+                edges.update(new_edges)
+                self._in_degree.update(new_edges.keys())
+                self._all_nodes.add(package)
+                self._all_nodes.update(new_edges)
+                frontier.extend(dep for dep in new_edges if dep not in visited)
+
+            depth += 1
+
+    def detect_cycles(self, start_package):
+        """
+        Поиск циклических зависимостей в построенном графе обходом в глубину:
+        сообщается каждый путь от стартового пакета не длиннее максимальной
+        глубины, замыкающийся на самого себя
+        """
+        graph = self.dependency_graph
+        max_depth = self.args.max_depth
+        # Пакеты, из которых не достижим ни один цикл: повторно не обходятся.
+        # Пакет помечается, только если его обход не был обрезан по глубине
+        acyclic = set()
+        on_path = set()
+        cycles = 0
+        truncated = 0
+        path = []
+        stack = []
+
+        def enter(package):
+            nonlocal truncated
+            path.append(package)
+            on_path.add(package)
+            frame = (cycles, truncated)
+            deps = graph.get(package)
+            if len(path) >= max_depth:
+                # Зависимости пакета лежат на максимальной глубине и не проверяются
+                truncated += bool(deps)
+                deps = None
+            stack.append((iter(deps or ()), *frame))
+
+        enter(start_package)
+
+        while stack:
+            deps, cycles_before, truncated_before = stack[-1]
+            for dep_package in deps:
+                if dep_package in on_path:
+                    print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(path + [dep_package])}")
+                    self.cycle_detected = True
+                    cycles += 1
+                elif dep_package not in acyclic:
+                    enter(dep_package)
+                    break
+            else:
+                stack.pop()
+                package = path.pop()
+                on_path.discard(package)
+                if cycles == cycles_before and truncated == truncated_before:
+                    acyclic.add(package)
 
-        # Добавляем узлы без входящих зависимостей
-        for node in all_nodes:
-            if node not in in_degree:
-                in_degree[node] = 0
+    def iter_load_order(self, start_package):
+        """
+        Порядок загрузки зависимостей (топологическая сортировка), выдаваемый
+        по одному пакету по мере расчета. После исчерпания в self.cyclic_nodes
+        остаются узлы циклов, не попавшие в порядок
+        """
+        # Узлы и входящие степени уже собраны при построении графа;
+        # обычный словарь заполняется нулями для всех узлов, затем степенями
+        # (копия, так как алгоритм их уменьшает)
+        all_nodes = self._all_nodes
+        in_degree = dict.fromkeys(all_nodes, 0)
+        in_degree.update(self._in_degree)
 
         # Алгоритм Кана (топологическая сортировка)
         queue = deque([node for node in all_nodes if in_degree[node] == 0])
-        load_order = []
+        emitted = 0
 
         while queue:
             current = queue.popleft()
-            load_order.append(current)
+            emitted += 1
+            yield current
 
-            for neighbor, _ in self.dependency_graph.get(current, []):
+            for neighbor in self.dependency_graph.get(current, {}):
                 in_degree[neighbor] -= 1
                 if in_degree[neighbor] == 0:
                     queue.append(neighbor)
 
-        # Проверка на циклы (если остались узлы с ненулевой степенью)
-        remaining_nodes = [node for node in all_nodes if in_degree[node] > 0]
-        if remaining_nodes:
-            print("⚠️  Обнаружены циклические зависимости, полный порядок загрузки невозможен")
-            print(f"   Циклические узлы: {remaining_nodes}")
+        # Проверка на циклы: не все узлы попали в порядок загрузки
+        self.cyclic_nodes = []
+        if emitted != len(all_nodes):
+            self.cyclic_nodes = [node for node in all_nodes if in_degree[node] > 0]
 
-        self.load_order = load_order
-        return load_order
+    def calculate_load_order(self, start_package):
+        """
+        Порядок загрузки зависимостей списком (для сравнения с npm)
+        """
+        return list(self.iter_load_order(start_package))
+
+    def print_cyclic_nodes(self):
+        """Предупреждение об узлах циклов, не попавших в порядок загрузки"""
+        if self.cyclic_nodes:
+            print("⚠️  Обнаружены циклические зависимости, полный порядок загрузки невозможен")
+            print(f"   Циклические узлы: {self.cyclic_nodes}")
 
     def print_load_order(self, start_package):
-        """Вывод порядка загрузки зависимостей"""
-        if not self.load_order:
+        """
+        Расчет и вывод порядка загрузки зависимостей: пакеты выводятся по мере
+        расчета, без списка всего порядка в памяти
+        """
+        print(f"\n📋 РАСЧЕТ ПОРЯДКА ЗАГРУЗКИ ДЛЯ ПАКЕТА '{start_package}'")
+
+        load_order = self.iter_load_order(start_package)
+        first = next(load_order, None)
+        if first is None:
+            self.print_cyclic_nodes()
             print("Порядок загрузки не рассчитан")
             return
 
-        print(f"\n=== ПОРЯДОК ЗАГРУЗКИ ЗАВИСИМОСТЕЙ ===")
-
-        # Фильтруем порядок, начиная с зависимостей (исключая стартовый пакет)
-        dependencies_order = [pkg for pkg in self.load_order if pkg != start_package]
+        write = sys.stdout.write
+        write(f"\n=== ПОРЯДОК ЗАГРУЗКИ ЗАВИСИМОСТЕЙ ===\nСтартовый пакет: {start_package}\n"
+              "\nПорядок загрузки зависимостей:\n")
 
-        print(f"Стартовый пакет: {start_package}")
-        print(f"\nПорядок загрузки зависимостей:")
+        # Стартовый пакет в списке не выводится: он загружается последним
+        count = 0
+        for package in chain((first,), load_order):
+            if package != start_package:
+                count += 1
+                write(f"{count:2d}. {package}\n")
 
-        for i, package in enumerate(dependencies_order, 1):
-            print(f"{i:2d}. {package}")
-
-        print(f"\nФинальная загрузка: {start_package}")
-        print(f"Всего зависимостей для загрузки: {len(dependencies_order)}")
+        self.print_cyclic_nodes()
+        write(f"\nФинальная загрузка: {start_package}\n"
+              f"Всего зависимостей для загрузки: {count}\n")
 
     def compare_with_npm(self, start_package):
         """
@@ -280,51 +496,64 @@ class PackageAnalyzer:
                 }
             }
 
-            with open('temp_package.json', 'w') as f:
-                json.dump(test_package_json, f)
-
-            # Запускаем npm ls для получения дерева зависимостей
-            result = subprocess.run(
-                ['npm', 'ls', '--json', '--prefix', '.'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-
-            if result.returncode == 0:
-                npm_data = json.loads(result.stdout)
+            # Путь к npm ищется в PATH один раз за запуск
+            if self._npm_executable is None:
+                self._npm_executable = shutil.which('npm') or 'npm'
+
+            # package.json кладется во временный каталог, который удаляется вместе с ним
+            with tempfile.TemporaryDirectory() as temp_dir:
+                with open(os.path.join(temp_dir, 'package.json'), 'wb') as f:
+                    f.write(json.dumps(test_package_json).encode('utf-8'))
+
+                # Запускаем npm ls для получения дерева зависимостей;
+                # вывод читается байтами и разбирается без промежуточной строки
+                result = subprocess.run(
+                    [self._npm_executable, 'ls', '--json', '--prefix', temp_dir],
+                    capture_output=True,
+                    timeout=30
+                )
+
+            # Код 1 npm ls возвращает и при проблемах в дереве (например, неустановленные
+            # пакеты: ELSPROBLEMS), но JSON с деревом в stdout при этом выводится
+            npm_data = None
+            if result.returncode in (0, 1) and result.stdout:
+                try:
+                    npm_data = json.loads(result.stdout)
+                except ValueError:
+                    npm_data = None
+
+            if npm_data is not None:
                 self.analyze_npm_comparison(npm_data, start_package)
             else:
                 print("⚠️  NPM не доступен или произошла ошибка")
-                print(f"   Ошибка: {result.stderr}")
+                print(f"   Ошибка: {result.stderr.decode('utf-8', errors='replace')}")
 
         except subprocess.TimeoutExpired:
             print("⚠️  Таймаут выполнения npm команды")
         except Exception as e:
             print(f"⚠️  Ошибка сравнения с npm: {e}")
-        finally:
-            # Удаляем временный файл
-            if os.path.exists('temp_package.json'):
-                os.remove('temp_package.json')
 
     def analyze_npm_comparison(self, npm_data, start_package):
         """Анализ различий между нашим расчетом и npm"""
         print("📊 АНАЛИЗ РАСХОЖДЕНИЙ:")
 
-        # Извлекаем зависимости из npm вывода
+        # Извлекаем зависимости из npm вывода (обход дерева через явный стек)
         npm_dependencies = set()
 
-        def extract_npm_deps(node, depth=0):
-            if 'dependencies' in node:
-                for dep_name, dep_info in node['dependencies'].items():
-                    npm_dependencies.add(dep_name)
-                    extract_npm_deps(dep_info, depth + 1)
+        def extract_npm_deps(root):
+            stack = [root]
+            while stack:
+                deps = stack.pop().get('dependencies')
+                if not deps:
+                    continue
+                npm_dependencies.update(deps)
+                stack.extend(deps.values())
 
         if 'dependencies' in npm_data:
             extract_npm_deps(npm_data['dependencies'].get(start_package, {}))
 
         # Наши рассчитанные зависимости
-        our_dependencies = set(self.load_order) - {start_package}
+        our_dependencies = set(self.calculate_load_order(start_package)) - {start_package}
 
         print(f"   - Зависимостей в npm: {len(npm_dependencies)}")
         print(f"   - Зависимостей в нашем анализе: {len(our_dependencies)}")
@@ -369,31 +598,32 @@ class PackageAnalyzer:
             }
         ]
 
-        print("\n" + "=" * 60)
-        print("ДЕМОНСТРАЦИЯ ПОРЯДКА ЗАГРУЗКИ")
-        print("=" * 60)
+        sys.stdout.write("\n" + "=" * 60 + "\nДЕМОНСТРАЦИЯ ПОРЯДКА ЗАГРУЗКИ\n" + "=" * 60 + "\n")
 
         original_max_depth = self.args.max_depth
 
         for i, test_case in enumerate(test_cases, 1):
-            print(f"\n🧪 ТЕСТ {i}: {test_case['name']}")
-            print("-" * 40)
+            sys.stdout.write(f"\n🧪 ТЕСТ {i}: {test_case['name']}\n" + "-" * 40 + "\n")
 
+            # Сбрасывается только граф: разобранный тестовый репозиторий
+            # и кэш зависимостей общие для всех тестов
             self.args.max_depth = test_case['max_depth']
             self.dependency_graph.clear()
+            self._in_degree.clear()
+            self._all_nodes.clear()
             self.cycle_detected = False
-            self.load_order = []
 
-            # Строим граф и рассчитываем порядок
+            # Строим граф, рассчитываем и выводим порядок
             self.build_dependency_graph_bfs(test_case['package'])
-            self.calculate_load_order(test_case['package'])
             self.print_load_order(test_case['package'])
+            sys.stdout.flush()
 
         self.args.max_depth = original_max_depth
 
     def run(self):
         """Основной метод запуска приложения"""
         try:
+            _buffer_stdout()
             args = self.parse_arguments()
 
             errors = self.validate_arguments(args)
@@ -405,12 +635,17 @@ class PackageAnalyzer:
 
             self.print_configuration(args)
             self.args = args
+            self.set_registry_url(args.url)
 
             start_package = args.package if args.package else "A"
 
+            if args.test_repo:
+                self._test_data = self.load_test_repository(args.test_repo)
+
             # Этапы 2-3: Получение зависимостей и построение графа
             dependencies = self.get_direct_dependencies(start_package)
             self.build_dependency_graph_bfs(start_package)
+            sys.stdout.flush()
 
             # Этап 4: Порядок загрузки
             if args.load_order:
@@ -418,12 +653,13 @@ class PackageAnalyzer:
                 print("ЭТАП 4: ПОРЯДОК ЗАГРУЗКИ ЗАВИСИМОСТЕЙ")
                 print(f"{'=' * 60}")
 
-                load_order = self.calculate_load_order(start_package)
                 self.print_load_order(start_package)
+                sys.stdout.flush()
 
                 # Сравнение с реальным npm (только для реальных пакетов)
                 if not args.test_repo and args.package:
                     self.compare_with_npm(start_package)
+                    sys.stdout.flush()
 
                 # Демонстрация для тестового репозитория
                 if args.test_repo:
@@ -434,6 +670,9 @@ class PackageAnalyzer:
         except Exception as e:
             print(f"❌ Ошибка: {e}")
             sys.exit(1)
+        finally:
+            self.close_connections()
+            sys.stdout.flush()
 
 
 if __name__ == "__main__":
@@ -1,68 +1,190 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
 import sys
 import os
 import json
-import urllib.request
-import urllib.error
-from collections import deque, defaultdict
+import gzip
+import http.client
+import urllib.parse
+import threading
+import sqlite3
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+
+# Допустимые схемы URL репозитория
+_URL_SCHEMES = ('http://', 'https://')
+
+# Число параллельных запросов к реестру при обходе графа
+MAX_FETCH_WORKERS = 16
+
+# Дисковый кэш зависимостей из реестра (переживает перезапуски); отдельно от
+# файловых кэшей других этапов в ~/.cache/package_analyzer
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'konfigura_2', 'deps.sqlite')
+
+# Шаблоны строк вывода графа (связанные методы format разбирают шаблон один раз)
+_NODE_FMT = "\n📦 {}:".format
+_EDGE_FMT = "   └── {} ({})".format
+_TREE_LINE_FMT = "{}{}{}{}".format
+
+# Сокращенные метаданные npm (только поля для установки, в разы меньше полного документа);
+# реестры без их поддержки ответят обычным JSON
+REGISTRY_ACCEPT = 'application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*'
+
+
+@lru_cache(maxsize=None)
+def _semver_key(version):
+    """Ключ сравнения версий semver: 1.10.0 > 1.9.0, пререлиз ниже релиза"""
+    core, _, prerelease = version.split('+', 1)[0].partition('-')
+    numbers = tuple(int(part) if part.isdigit() else 0 for part in core.split('.'))
+    return numbers, not prerelease, prerelease
+
+
+@lru_cache(maxsize=8)
+def _load_test_repo(file_path, mtime):
+    """Разбор файла тестового репозитория (кэшируется, пока файл не изменился)"""
+    try:
+        with open(file_path, 'rb') as f:
+            test_data = json.loads(f.read())
+
+        if not isinstance(test_data, dict):
+            raise Exception("Тестовые данные должны быть словарем")
+
+        return test_data
+
+    except json.JSONDecodeError as e:
+        raise Exception(f"Ошибка парсинга JSON файла: {e}")
+    except Exception as e:
+        raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
+
+
+def _build_parser():
+    """Парсер аргументов командной строки (создается один раз при импорте)"""
+    parser = argparse.ArgumentParser(
+        description='Инструмент визуализации графа зависимостей npm пакетов',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Примеры использования:
+  python package_analyzer.py --package react --url https://registry.npmjs.org
+  python package_analyzer.py --test-repo test_data.json --max-depth 3
+  python package_analyzer.py --package lodash --ascii-tree --max-depth 2
+        '''
+    )
+
+    # Основные параметры
+    parser.add_argument(
+        '--package',
+        type=str,
+        help='Имя анализируемого пакета'
+    )
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        default='https://registry.npmjs.org',
+        help='URL репозитория npm (по умолчанию: https://registry.npmjs.org)'
+    )
+
+    parser.add_argument(
+        '--test-repo',
+        type=str,
+        help='Путь к файлу тестового репозитория'
+    )
+
+    parser.add_argument(
+        '--ascii-tree',
+        action='store_true',
+        help='Режим вывода в формате ASCII-дерева'
+    )
+
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=3,
+        help='Максимальная глубина анализа зависимостей (по умолчанию: 3)'
+    )
+
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Не выводить отдельные зависимости и ход загрузки, только итоги'
+    )
+
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Вывести граф зависимостей в stdout в формате JSON (текстовый вывод - в stderr)'
+    )
+
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        default=86400,
+        help='Время жизни дискового кэша зависимостей в секундах, 0 - без кэша (по умолчанию: 86400)'
+    )
+
+    return parser
+
+
+_PARSER = _build_parser()
+
+
+def _buffer_stdout():
+    """
+    Блочная буферизация stdout: вывод копится и сбрасывается после каждого этапа,
+    а не построчно. Потоки без reconfigure (подмененный stdout) остаются как есть
+    """
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(line_buffering=False)
 
 
 class PackageAnalyzer:
     def __init__(self):
         self.args = None
         self.dependencies = {}
-        self.dependency_graph = defaultdict(list)
+        # Граф в виде плоских массивов: имена пакетов заменены номерами,
+        # ребра пакета лежат подряд в edges_dst/edges_ver на отрезке edge_ranges[номер]
+        self.node_names = []
+        self.name_to_id = {}
+        self.edges_dst = array('l')
+        self.edges_ver = []
+        self.edge_ranges = {}
         self.visited = set()
         self.cycle_detected = False
+        # Найденные циклы (пути), чтобы повторить предупреждения для графа из кэша
+        self.cycles = []
+        # Уже раскрытые пакеты. Обход по уровням впервые встречает пакет на наименьшей
+        # глубине, то есть с наибольшим остатком глубины, поэтому повторно он не раскрывается
+        self.fully_explored = set()
+        # Уже добавленные ребра (номер пакета, номер зависимости)
+        self.edges_added = set()
+        # Зависимости, уже полученные за время запуска, и разобранный тестовый репозиторий
+        self._dep_cache = {}
+        self._test_repo_data = None
+        # Построенные графы: (корень, максимальная глубина) -> snapshot_graph()
+        self._graph_cache = {}
+        # Keep-alive соединения с реестром: свои у каждого потока загрузки
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+        # Реестр: URL без завершающего '/', схема, хост и путь (заполняются в run())
+        self._registry_url = None
+        self._registry_scheme = None
+        self._registry_netloc = None
+        self._registry_path = ''
+        # Уже запущенные загрузки зависимостей: пакет -> Future
+        self._prefetch_futures = {}
+        # Соединение с дисковым кэшем (общее для потоков, доступ под блокировкой)
+        self._cache_db = None
+        self._cache_lock = threading.Lock()
 
     def parse_arguments(self):
         """Парсинг аргументов командной строки"""
-        parser = argparse.ArgumentParser(
-            description='Инструмент визуализации графа зависимостей npm пакетов',
-            formatter_class=argparse.RawDescriptionHelpFormatter,
-            epilog='''
-Примеры использования:
-  python package_analyzer.py --package react --url https://registry.npmjs.org
-  python package_analyzer.py --test-repo test_data.json --max-depth 3
-  python package_analyzer.py --package lodash --ascii-tree --max-depth 2
-            '''
-        )
-
-        # Основные параметры
-        parser.add_argument(
-            '--package',
-            type=str,
-            help='Имя анализируемого пакета'
-        )
-
-        parser.add_argument(
-            '--url',
-            type=str,
-            default='https://registry.npmjs.org',
-            help='URL репозитория npm (по умолчанию: https://registry.npmjs.org)'
-        )
-
-        parser.add_argument(
-            '--test-repo',
-            type=str,
-            help='Путь к файлу тестового репозитория'
-        )
-
-        parser.add_argument(
-            '--ascii-tree',
-            action='store_true',
-            help='Режим вывода в формате ASCII-дерева'
-        )
-
-        parser.add_argument(
-            '--max-depth',
-            type=int,
-            default=3,
-            help='Максимальная глубина анализа зависимостей (по умолчанию: 3)'
-        )
-
-        return parser.parse_args()
+        return _PARSER.parse_args()
 
     def validate_arguments(self, args):
         """Валидация аргументов командной строки"""
@@ -81,8 +203,11 @@ class PackageAnalyzer:
         elif args.max_depth > 10:
             print("Предупреждение: большая глубина анализа может привести к длительному выполнению")
 
+        if args.cache_ttl < 0:
+            errors.append("Время жизни кэша не может быть отрицательным")
+
         # Проверка URL
-        if args.url and not args.url.startswith(('http://', 'https://')):
+        if args.url and not args.url.startswith(_URL_SCHEMES):
             errors.append("URL должен начинаться с http:// или https://")
 
         # Проверка файла тестового репозитория
@@ -102,64 +227,111 @@ class PackageAnalyzer:
             "Максимальная глубина": args.max_depth
         }
 
-        for key, value in config.items():
-            print(f"{key}: {value}")
-        print("=" * 50)
+        lines = [f"{key}: {value}" for key, value in config.items()]
+        sys.stdout.write("\n".join(lines) + "\n" + "=" * 50 + "\n")
+
+    def set_registry_url(self, registry_url):
+        """Нормализация URL реестра: схема, хост и префикс пути вычисляются один раз"""
+        registry_url = registry_url.rstrip('/')
+        parts = urllib.parse.urlsplit(registry_url)
+        self._registry_url = registry_url
+        self._registry_scheme = parts.scheme
+        self._registry_netloc = parts.netloc
+        self._registry_path = parts.path
+
+    def get_connection(self, scheme, netloc):
+        """Переиспользуемое keep-alive соединение с хостом реестра для текущего потока"""
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+
+        conn = conns.get((scheme, netloc))
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(netloc, timeout=10)
+            conns[(scheme, netloc)] = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close_connections(self):
+        """Закрытие всех открытых соединений с реестром"""
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+    def report(self, log, message):
+        """Сообщение о ходе загрузки: сразу в stdout или в журнал задачи пула потоков"""
+        if log is None:
+            print(message)
+        else:
+            log.append(message)
 
-    def fetch_package_info(self, package_name, registry_url):
+    def fetch_package_info(self, package_name, log=None):
         """
         Получение информации о пакете из npm registry
         """
-        try:
-            package_url = f"{registry_url}/{package_name}"
-
-            print(f"Запрос информации о пакете: {package_url}")
-
-            req = urllib.request.Request(
-                package_url,
-                headers={'User-Agent': 'PackageAnalyzer/1.0'}
-            )
+        # Слэш scoped-пакетов (@babel/core) кодируется, '@' остается как есть
+        package_path = '/' + urllib.parse.quote(package_name, safe='@')
+        if not self.args.quiet:
+            self.report(log, f"Запрос информации о пакете: {self._registry_url}{package_path}")
+
+        scheme, netloc = self._registry_scheme, self._registry_netloc
+        headers = {
+            'User-Agent': 'PackageAnalyzer/1.0',
+            'Accept': REGISTRY_ACCEPT,
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive'
+        }
 
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status == 200:
-                    data = json.loads(response.read().decode('utf-8'))
-                    return data
-                else:
-                    raise Exception(f"HTTP {response.status}: {response.reason}")
+        try:
+            for attempt in range(2):
+                conn = self.get_connection(scheme, netloc)
+                try:
+                    conn.request('GET', self._registry_path + package_path, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    # Сервер закрыл простаивающее соединение - переподключаемся один раз
+                    conn.close()
+                    del self._local.conns[(scheme, netloc)]
+                    if attempt:
+                        raise
+        except (http.client.HTTPException, OSError) as e:
+            raise Exception(f"Ошибка подключения: {e}")
+
+        if response.status == 404:
+            raise Exception(f"Пакет '{package_name}' не найден в репозитории")
+        if response.status != 200:
+            raise Exception(f"Ошибка HTTP {response.status}: {response.reason}")
 
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                raise Exception(f"Пакет '{package_name}' не найден в репозитории")
-            else:
-                raise Exception(f"Ошибка HTTP {e.code}: {e.reason}")
-        except urllib.error.URLError as e:
-            raise Exception(f"Ошибка подключения: {e.reason}")
-        except json.JSONDecodeError as e:
+        try:
+            # JSON реестра хорошо сжимается: по сети передается gzip
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            return json.loads(body)
+        except (OSError, json.JSONDecodeError) as e:
             raise Exception(f"Ошибка парсинга JSON: {e}")
-        except Exception as e:
-            raise Exception(f"Ошибка получения информации о пакете: {e}")
 
     def extract_dependencies(self, package_data):
         """
         Извлечение зависимостей из данных пакета
         """
         try:
-            if 'dist-tags' in package_data and 'latest' in package_data['dist-tags']:
-                latest_version = package_data['dist-tags']['latest']
-            else:
-                versions = list(package_data.get('versions', {}).keys())
-                if not versions:
+            latest_version = package_data.get('dist-tags', {}).get('latest')
+            if latest_version is None:
+                # Без dist-tags берется старшая версия по semver, а не последняя по порядку ключей
+                latest_version = max(package_data.get('versions', {}), key=_semver_key, default=None)
+                if latest_version is None:
                     return {}
-                latest_version = versions[-1]
 
             version_data = package_data['versions'].get(latest_version, {})
 
-            dependencies = {}
-
-            if 'dependencies' in version_data:
-                dependencies.update(version_data['dependencies'])
-
-            return dependencies
+            # Имена пакетов интернируются: одна строка на имя во всем графе
+            return {sys.intern(dep): version for dep, version in version_data.get('dependencies', {}).items()}
 
         except KeyError as e:
             raise Exception(f"Отсутствует ожидаемое поле в данных пакета: {e}")
@@ -171,41 +343,105 @@ class PackageAnalyzer:
         Загрузка тестового репозитория из файла
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                test_data = json.load(f)
+            mtime = os.path.getmtime(file_path)
+        except OSError as e:
+            raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
+        return _load_test_repo(file_path, mtime)
 
-            if not isinstance(test_data, dict):
-                raise Exception("Тестовые данные должны быть словарем")
+    def open_cache(self):
+        """Открытие дискового кэша зависимостей (без кэша, если файл недоступен)"""
+        try:
+            os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+            db = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS deps("
+                "registry TEXT, name TEXT, json TEXT, fetched REAL, PRIMARY KEY (registry, name))"
+            )
+            db.commit()
+            self._cache_db = db
+        except (OSError, sqlite3.Error):
+            self._cache_db = None
+
+    def close_cache(self):
+        """Закрытие дискового кэша"""
+        if self._cache_db is not None:
+            self._cache_db.close()
+            self._cache_db = None
+
+    def load_cached_dependencies(self, package_name):
+        """Зависимости из дискового кэша или None, если записи нет или она устарела"""
+        if self._cache_db is None:
+            return None
+        try:
+            with self._cache_lock:
+                row = self._cache_db.execute(
+                    "SELECT json FROM deps WHERE registry = ? AND name = ? AND fetched > ?",
+                    (self._registry_url, package_name, time.time() - self.args.cache_ttl)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return tuple((sys.intern(dep), version) for dep, version in json.loads(row[0]).items())
+
+    def store_cached_dependencies(self, package_name, dependencies):
+        """Сохранение зависимостей в дисковый кэш (ошибки записи не критичны)"""
+        if self._cache_db is None:
+            return
+        try:
+            with self._cache_lock:
+                self._cache_db.execute(
+                    "INSERT OR REPLACE INTO deps VALUES (?, ?, ?, ?)",
+                    (self._registry_url, package_name, json.dumps(dict(dependencies)), time.time())
+                )
+                self._cache_db.commit()
+        except sqlite3.Error:
+            pass
 
-            return test_data
+    def get_direct_dependencies(self, package_name):
+        """
+        Получение прямых зависимостей для пакета (каждый пакет загружается один раз за запуск).
+        Возвращает кортеж пар (имя, версия)
+        """
+        if package_name in self._dep_cache:
+            return self._dep_cache[package_name]
 
-        except json.JSONDecodeError as e:
-            raise Exception(f"Ошибка парсинга JSON файла: {e}")
-        except Exception as e:
-            raise Exception(f"Ошибка загрузки тестового репозитория: {e}")
+        dependencies = self.load_direct_dependencies(package_name)
+        self._dep_cache[package_name] = dependencies
+        return dependencies
 
-    def get_direct_dependencies(self, package_name):
+    def load_direct_dependencies(self, package_name, log=None):
         """
-        Получение прямых зависимостей для пакета
+        Загрузка прямых зависимостей пакета без обращения к _dep_cache (его заполняет
+        только основной поток). Сообщения пишутся в log, если он передан
         """
-        print(f"\n=== ПОЛУЧЕНИЕ ЗАВИСИМОСТЕЙ ДЛЯ ПАКЕТА: {package_name} ===")
+        if not self.args.quiet:
+            self.report(log, f"\n=== ПОЛУЧЕНИЕ ЗАВИСИМОСТЕЙ ДЛЯ ПАКЕТА: {package_name} ===")
 
         if self.args.test_repo:
-            # Режим тестового репозитория
-            test_data = self.load_test_repository(self.args.test_repo)
-            dependencies = test_data.get(package_name, [])
+            # Режим тестового репозитория: файл разбирается один раз
+            with self._lock:
+                if self._test_repo_data is None:
+                    self._test_repo_data = self.load_test_repository(self.args.test_repo)
+            dependencies = self._test_repo_data.get(package_name, [])
 
             if not dependencies:
-                print(f"Пакет '{package_name}' не найден в тестовом репозитории")
-                return {}
-
-            dependencies_dict = {dep: "*" for dep in dependencies}
-            return dependencies_dict
+                if not self.args.quiet:
+                    self.report(log, f"Пакет '{package_name}' не найден в тестовом репозитории")
+                dependencies = ()
+            else:
+                dependencies = tuple((sys.intern(dep), "*") for dep in dependencies)
         else:
-            # Режим реального репозитория
-            package_data = self.fetch_package_info(package_name, self.args.url)
-            dependencies = self.extract_dependencies(package_data)
-            return dependencies
+            # Режим реального репозитория: сначала дисковый кэш, затем сеть
+            dependencies = self.load_cached_dependencies(package_name)
+            if dependencies is None:
+                package_data = self.fetch_package_info(package_name, log)
+                dependencies = tuple(self.extract_dependencies(package_data).items())
+                self.store_cached_dependencies(package_name, dependencies)
+
+        return dependencies
 
     def print_direct_dependencies(self, dependencies, package_name):
         """
@@ -215,68 +451,267 @@ class PackageAnalyzer:
             print(f"Пакет '{package_name}' не имеет зависимостей")
             return
 
-        print(f"\n=== ПРЯМЫЕ ЗАВИСИМОСТИ ПАКЕТА '{package_name}': ===")
+        # Весь блок собирается в список и выводится одной записью
+        lines = [f"\n=== ПРЯМЫЕ ЗАВИСИМОСТИ ПАКЕТА '{package_name}': ==="]
+        if not self.args.quiet:
+            lines.extend(f"{i:2d}. {dep}: {version}" for i, (dep, version) in enumerate(dependencies, 1))
+        lines.append(f"Всего прямых зависимостей: {len(dependencies)}")
 
-        for i, (dep, version) in enumerate(dependencies.items(), 1):
-            print(f"{i:2d}. {dep}: {version}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
-        print(f"Всего прямых зависимостей: {len(dependencies)}")
-
-    def build_dependency_graph_bfs(self, start_package, current_depth=0, path=None):
+    def fetch_dependencies_safe(self, package_name):
         """
-        Построение графа зависимостей с помощью BFS с рекурсией
+        Зависимости пакета для пула потоков: (зависимости, ошибка, сообщения).
+        Сообщения выводит основной поток, чтобы вывод задач не перемешивался
         """
-        if path is None:
-            path = []
+        dependencies = self._dep_cache.get(package_name)
+        if dependencies is not None:
+            return dependencies, None, None
 
-        # Проверка максимальной глубины
-        if current_depth >= self.args.max_depth:
-            return
+        log = []
+        try:
+            return self.load_direct_dependencies(package_name, log), None, log
+        except Exception as e:
+            return None, e, log
+
+    def node_id(self, package_name):
+        """Номер пакета в графе (новые имена получают следующий номер)"""
+        node = self.name_to_id.get(package_name)
+        if node is None:
+            node = self.name_to_id[package_name] = len(self.node_names)
+            self.node_names.append(package_name)
+        return node
+
+    def add_edges(self, package_name, dependencies):
+        """Добавление ребер пакета одним отрезком массивов (каждое ребро один раз)"""
+        src = self.node_id(package_name)
+        start = len(self.edges_dst)
+
+        for dep_package, version in dependencies:
+            dst = self.node_id(dep_package)
+            if (src, dst) in self.edges_added:
+                continue
+            self.edges_added.add((src, dst))
+            self.edges_dst.append(dst)
+            self.edges_ver.append(version)
+
+        if len(self.edges_dst) > start:
+            self.edge_ranges[src] = (start, len(self.edges_dst))
+
+    def clear_graph(self):
+        """Сброс построенного графа (кэши загрузки сохраняются)"""
+        # Контейнеры заменяются новыми, а не очищаются: прежние могут лежать в _graph_cache
+        self.node_names = []
+        self.name_to_id = {}
+        self.edges_dst = array('l')
+        self.edges_ver = []
+        self.edge_ranges = {}
+        self.fully_explored = set()
+        self.edges_added = set()
+        self.cycles = []
+        self.cycle_detected = False
 
-        # Проверка циклических зависимостей
-        if start_package in path:
-            print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(path + [start_package])}")
-            self.cycle_detected = True
+    def snapshot_graph(self):
+        """Текущее состояние графа для _graph_cache (без копирования)"""
+        return (self.node_names, self.name_to_id, self.edges_dst, self.edges_ver,
+                self.edge_ranges, self.fully_explored, self.edges_added,
+                self.cycles, self.cycle_detected)
+
+    def restore_graph(self, snapshot):
+        """Восстановление графа из _graph_cache"""
+        (self.node_names, self.name_to_id, self.edges_dst, self.edges_ver,
+         self.edge_ranges, self.fully_explored, self.edges_added,
+         self.cycles, self.cycle_detected) = snapshot
+
+    def prefetch_dependencies(self, executor, package_name):
+        """Запуск загрузки зависимостей пакета в пуле (не более одного раза на пакет)"""
+        future = self._prefetch_futures.get(package_name)
+        if future is None:
+            future = executor.submit(self.fetch_dependencies_safe, package_name)
+            self._prefetch_futures[package_name] = future
+        return future
+
+    def build_dependency_graph_bfs(self, start_package):
+        """
+        Построение графа зависимостей обходом в ширину: пакеты одного уровня
+        загружаются параллельно
+        """
+        start_package = sys.intern(start_package)
+        queue = deque([start_package])
+        current_depth = 0
+
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            while queue and current_depth < self.args.max_depth:
+                # Текущий уровень: каждый пакет раскрывается один раз
+                level = []
+                while queue:
+                    package = queue.popleft()
+                    if package in self.fully_explored:
+                        continue
+                    self.fully_explored.add(package)
+                    level.append(package)
+
+                futures = [self.prefetch_dependencies(executor, package) for package in level]
+                expand_next = current_depth + 1 < self.args.max_depth
+
+                for package, future in zip(level, futures):
+                    dependencies, error, log = future.result()
+                    if log:
+                        sys.stdout.write("\n".join(log) + "\n")
+                    if error is not None:
+                        print(f"⚠️  Ошибка при обработке пакета {package}: {error}")
+                        continue
+
+                    # Результаты задач попадают в кэш зависимостей только здесь, в основном потоке
+                    self._dep_cache[package] = dependencies
+
+                    # Добавляем зависимости в граф
+                    self.add_edges(package, dependencies)
+
+                    if not expand_next:
+                        continue
+
+                    for dep_package, _ in dependencies:
+                        if dep_package not in self.fully_explored:
+                            queue.append(dep_package)
+                            # Следующий уровень начинает загружаться, пока разбирается текущий
+                            self.prefetch_dependencies(executor, dep_package)
+
+                current_depth += 1
+
+        self._prefetch_futures.clear()
+        self.detect_cycles(start_package)
+
+    def detect_cycles(self, start_package):
+        """
+        Поиск циклических зависимостей в построенном графе обходом в глубину:
+        сообщается каждый путь от стартового пакета не длиннее максимальной
+        глубины, замыкающийся на самого себя
+        """
+        root = self.name_to_id.get(start_package)
+        if root is None:
             return
 
-        # Помечаем пакет как посещенный на текущем пути
-        current_path = path + [start_package]
+        names, edges_dst, edge_ranges = self.node_names, self.edges_dst, self.edge_ranges
+        max_depth = self.args.max_depth
+        no_edges = (0, 0)
+        # Пакеты, из которых не достижим ни один цикл: повторно не обходятся.
+        # Пакет помечается, только если его обход не был обрезан по глубине
+        acyclic = bytearray(len(names))
+        on_path = bytearray(len(names))
+        truncated = 0
+        path = []
+        stack = []
+
+        def enter(node):
+            nonlocal truncated
+            path.append(node)
+            on_path[node] = 1
+            frame = (len(self.cycles), truncated)
+            if len(path) < max_depth:
+                edges = range(*edge_ranges.get(node, no_edges))
+            else:
+                # Зависимости пакета лежат на максимальной глубине и не проверяются
+                edges = ()
+                truncated += node in edge_ranges
+            stack.append((iter(edges), *frame))
+
+        enter(root)
+
+        while stack:
+            edges, cycles_before, truncated_before = stack[-1]
+            for i in edges:
+                dst = edges_dst[i]
+                if on_path[dst]:
+                    cycle = [names[node] for node in path]
+                    cycle.append(names[dst])
+                    print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(cycle)}")
+                    self.cycles.append(cycle)
+                    self.cycle_detected = True
+                elif not acyclic[dst]:
+                    enter(dst)
+                    break
+            else:
+                stack.pop()
+                node = path.pop()
+                on_path[node] = 0
+                if len(self.cycles) == cycles_before and truncated == truncated_before:
+                    acyclic[node] = 1
 
-        # Получаем зависимости для текущего пакета
-        try:
-            dependencies = self.get_direct_dependencies(start_package)
+    def print_dependency_graph(self, start_package):
+        """
+        Вывод графа зависимостей
+        """
+        if not self.edge_ranges:
+            print("Граф зависимостей пуст")
+            return
 
-            for dep_package, version in dependencies.items():
-                # Добавляем зависимость в граф
-                self.dependency_graph[start_package].append((dep_package, version))
+        # Весь граф собирается в список и выводится одной записью
+        lines = [f"\n=== ГРАФ ЗАВИСИМОСТЕЙ ДЛЯ ПАКЕТА '{start_package}' (глубина: {self.args.max_depth}) ==="]
 
-                # Рекурсивно строим граф для зависимостей
-                self.build_dependency_graph_bfs(dep_package, current_depth + 1, current_path)
+        names, edges_dst, edges_ver = self.node_names, self.edges_dst, self.edges_ver
+        if not self.args.quiet:
+            for src, (start, stop) in self.edge_ranges.items():
+                lines.append(_NODE_FMT(names[src]))
+                lines.extend(_EDGE_FMT(names[edges_dst[i]], edges_ver[i]) for i in range(start, stop))
+        total_dependencies = len(edges_dst)
 
-        except Exception as e:
-            print(f"⚠️  Ошибка при обработке пакета {start_package}: {e}")
+        lines.append(f"\n📊 Статистика графа:")
+        lines.append(f"   - Узлов: {len(self.edge_ranges)}")
+        lines.append(f"   - Зависимостей: {total_dependencies}")
+        lines.append(f"   - Циклические зависимости: {'Да' if self.cycle_detected else 'Нет'}")
 
-    def print_dependency_graph(self, start_package):
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    def print_ascii_tree(self, start_package):
         """
-        Вывод графа зависимостей
+        Вывод графа в виде ASCII-дерева (итеративно, одной записью).
+        Уже выведенные поддеревья не повторяются и помечаются (*)
         """
-        if not self.dependency_graph:
-            print("Граф зависимостей пуст")
+        lines = [f"\n🌳 ASCII-ДЕРЕВО ЗАВИСИМОСТЕЙ ДЛЯ: {start_package}", "=" * 50]
+        # Пакет без зависимостей может отсутствовать в графе - выводится один корень
+        # (граф при выводе не меняется: он может лежать в _graph_cache)
+        root = self.name_to_id.get(start_package)
+        if root is None:
+            lines.append(_TREE_LINE_FMT("", "└── ", start_package, ""))
+            sys.stdout.write("\n".join(lines) + "\n")
             return
 
-        print(f"\n=== ГРАФ ЗАВИСИМОСТЕЙ ДЛЯ ПАКЕТА '{start_package}' (глубина: {self.args.max_depth}) ===")
+        names, edges_dst, edges_ver = self.node_names, self.edges_dst, self.edges_ver
+        seen = bytearray(len(names))
+        stack = [(root, "*", "", True)]
+
+        while stack:
+            node, version, prefix, is_last = stack.pop()
+            connector = "└── " if is_last else "├── "
+            # Версия "*" тестового репозитория не выводится, чтобы не путать ее с пометкой (*)
+            version_suffix = "" if version == "*" else f" ({version})"
+
+            if seen[node]:
+                lines.append(_TREE_LINE_FMT(prefix, connector, names[node], version_suffix + " (*)"))
+                continue
+
+            seen[node] = 1
+            lines.append(_TREE_LINE_FMT(prefix, connector, names[node], version_suffix))
 
-        total_dependencies = 0
-        for package, deps in self.dependency_graph.items():
-            print(f"\n📦 {package}:")
-            for dep, version in deps:
-                print(f"   └── {dep} ({version})")
-                total_dependencies += 1
+            child_prefix = prefix + ("    " if is_last else "│   ")
+            start, stop = self.edge_ranges.get(node, (0, 0))
 
-        print(f"\n📊 Статистика графа:")
-        print(f"   - Узлов: {len(self.dependency_graph)}")
-        print(f"   - Зависимостей: {total_dependencies}")
-        print(f"   - Циклические зависимости: {'Да' if self.cycle_detected else 'Нет'}")
+            # Дочерние узлы кладем в обратном порядке, чтобы снимать их со стека по порядку
+            for i in range(stop - 1, start - 1, -1):
+                stack.append((edges_dst[i], edges_ver[i], child_prefix, i == stop - 1))
+
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    def print_graph_json(self):
+        """Вывод графа зависимостей в stdout одним JSON-документом: пакет -> {зависимость: версия}"""
+        names, edges_dst, edges_ver = self.node_names, self.edges_dst, self.edges_ver
+        graph = {
+            names[src]: {names[edges_dst[i]]: edges_ver[i] for i in range(start, stop)}
+            for src, (start, stop) in self.edge_ranges.items()
+        }
+        json.dump(graph, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
 
     def demonstrate_test_cases(self):
         """
@@ -312,19 +747,65 @@ class PackageAnalyzer:
 
             # Временно меняем настройки для теста
             self.args.max_depth = test_case['max_depth']
-            self.dependency_graph.clear()
-            self.cycle_detected = False
-
-            # Строим граф
-            self.build_dependency_graph_bfs(test_case['package'])
+            key = (test_case['package'], test_case['max_depth'])
+
+            cached = self._graph_cache.get(key)
+            if cached is not None:
+                # Граф с теми же корнем и глубиной уже построен - повторяем только предупреждения
+                self.restore_graph(cached)
+                for cycle in self.cycles:
+                    print(f"⚠️  Обнаружена циклическая зависимость: {' -> '.join(cycle)}")
+            else:
+                # Строим граф; зависимости уже обойденных пакетов берутся из _dep_cache,
+                # так что меньшая глубина того же корня собирается без загрузок
+                self.clear_graph()
+                self.build_dependency_graph_bfs(test_case['package'])
+                self._graph_cache[key] = self.snapshot_graph()
             self.print_dependency_graph(test_case['package'])
+            if self.args.ascii_tree:
+                self.print_ascii_tree(test_case['package'])
+            sys.stdout.flush()
 
         # Восстанавливаем оригинальную глубину
         self.args.max_depth = original_max_depth
 
+    def analyze(self):
+        """Этапы 2-3: прямые зависимости, граф и демонстрация тестовых случаев"""
+        args = self.args
+        self.print_configuration(args)
+
+        # Определяем стартовый пакет
+        start_package = args.package if args.package else "A"
+
+        # Этап 2: Получение прямых зависимостей
+        dependencies = self.get_direct_dependencies(start_package)
+        self.print_direct_dependencies(dependencies, start_package)
+        sys.stdout.flush()
+
+        # Этап 3: Построение полного графа зависимостей
+        print(f"\n{'=' * 60}")
+        print("ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ЗАВИСИМОСТЕЙ")
+        print(f"{'=' * 60}")
+
+        self.build_dependency_graph_bfs(start_package)
+        self._graph_cache[(start_package, args.max_depth)] = self.snapshot_graph()
+        self.print_dependency_graph(start_package)
+        if args.ascii_tree:
+            self.print_ascii_tree(start_package)
+        sys.stdout.flush()
+
+        # Демонстрация тестовых случаев для тестового репозитория
+        # (в режиме JSON пропускается: она перестраивает граф)
+        if args.test_repo and not args.json:
+            self.demonstrate_test_cases()
+
+        print("\n✅ Этап 3 выполнен успешно! Граф зависимостей построен.")
+
     def run(self):
         """Основной метод запуска приложения"""
         try:
+            _buffer_stdout()
+
             # Парсинг аргументов
             args = self.parse_arguments()
 
@@ -336,34 +817,26 @@ class PackageAnalyzer:
                     print(f"  - {error}")
                 sys.exit(1)
 
-            self.print_configuration(args)
-
             self.args = args
-
-            # Определяем стартовый пакет
-            start_package = args.package if args.package else "A"
-
-            # Этап 2: Получение прямых зависимостей
-            dependencies = self.get_direct_dependencies(start_package)
-            self.print_direct_dependencies(dependencies, start_package)
-
-            # Этап 3: Построение полного графа зависимостей
-            print(f"\n{'=' * 60}")
-            print("ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ЗАВИСИМОСТЕЙ")
-            print(f"{'=' * 60}")
-
-            self.build_dependency_graph_bfs(start_package)
-            self.print_dependency_graph(start_package)
-
-            # Демонстрация тестовых случаев для тестового репозитория
-            if args.test_repo:
-                self.demonstrate_test_cases()
-
-            print("\n✅ Этап 3 выполнен успешно! Граф зависимостей построен.")
+            self.set_registry_url(args.url)
+            if not args.test_repo and args.cache_ttl > 0:
+                self.open_cache()
+
+            if args.json:
+                # В stdout попадает только JSON графа, текстовый вывод уходит в stderr
+                with contextlib.redirect_stdout(sys.stderr):
+                    self.analyze()
+                self.print_graph_json()
+            else:
+                self.analyze()
 
         except Exception as e:
             print(f"❌ Ошибка: {e}")
             sys.exit(1)
+        finally:
+            self.close_connections()
+            self.close_cache()
+            sys.stdout.flush()
 
 
 if __name__ == "__main__":